@@ -1,25 +1,38 @@
-﻿import os, math, time, requests, geopandas as gpd, pandas as pd
+﻿import os, math, time, requests, numpy as np, geopandas as gpd, pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from shapely.geometry import box, Point
 from datetime import datetime, timezone
 from src.utils.config import BBOX, RAW_DIR, PROCESSED_DIR
+from src.utils.paths import latest_file
 
 OPEN_METEO_URL = ("https://api.open-meteo.com/v1/forecast"
                   "?latitude={lat}&longitude={lon}"
                   "&hourly=temperature_2m,relative_humidity_2m,windspeed_10m,winddirection_10m"
                   "&forecast_days=2&timezone=UTC")
 
+# ---- Adaptive sampling ----
+MAX_REQUESTS    = 280   # Open-Meteo calls per run; the old stride made 300
+COARSE_FRACTION = 0.95  # share of the budget spent on the uniform first pass
+BATCH_SIZE      = 30    # cells fetched concurrently per refinement round
+WORKERS         = 8
+NEIGHBOURS      = 4     # nearest samples compared when scoring disagreement
+FIRE_WEIGHT     = 1.0   # pull of FIRMS density relative to weather disagreement
+FIRE_RADIUS     = 2     # cells; ~10 km, the merge step's FIRMS buffer
+SPACE_WEIGHT    = 0.2   # keeps some budget filling gaps away from fronts and fires
+FIELDS = ("temperature_2m", "relative_humidity_2m", "windspeed_10m")
+
 def make_grid(bbox, cell_km=5.0):
     w,s,e,n = bbox
     mid = (s+n)/2.0
     km_lat, km_lon = 111.0, 111.320*math.cos(math.radians(mid))
     dlat, dlon = cell_km/km_lat, cell_km/km_lon
     cols, rows = int(max(1, math.ceil((e-w)/dlon))), int(max(1, math.ceil((n-s)/dlat)))
-    cells=[]
+    cells=[]; ij=[]
     for i in range(cols):
         for j in range(rows):
             x1=w+i*dlon; y1=s+j*dlat; x2=min(e,x1+dlon); y2=min(n,y1+dlat)
-            cells.append(box(x1,y1,x2,y2))
-    return gpd.GeoDataFrame(geometry=cells, crs="EPSG:4326")
+            cells.append(box(x1,y1,x2,y2)); ij.append((i,j))
+    return gpd.GeoDataFrame(pd.DataFrame(ij, columns=["col","row"]), geometry=cells, crs="EPSG:4326")
 
 def fetch(lat, lon, retries=2, backoff=1.3):
     url = OPEN_METEO_URL.format(lat=lat, lon=lon)
@@ -50,26 +63,127 @@ def latest_hour(payload):
         "winddirection_10m": gv("winddirection_10m"),
     }
 
+def sample(lat, lon):
+    try:
+        lh = latest_hour(fetch(lat, lon))
+    except Exception as e:
+        print(f"⚠ Weather fetch failed for {lat:.4f},{lon:.4f}: {e}")
+        return None
+    if lh:
+        lh["lat"]=lat; lh["lon"]=lon
+    return lh
+
+def load_firms_points():
+    """Latest FIRMS detections in EPSG:4326, or None before the first FIRMS run."""
+    p = latest_file(os.path.join(PROCESSED_DIR, "firms_*.geojson"))
+    return gpd.read_file(p).to_crs("EPSG:4326") if p else None
+
+def coarse_cells(grid, n):
+    """Indices of a staggered (hexagonal) lattice of at most n cells. Column and
+    row counts are chosen separately so long, narrow grids are still covered
+    end to end; alternate columns shift by half a row step, which leaves
+    smaller gaps than a square lattice for the same number of calls."""
+    cols, rows = int(grid["col"].max())+1, int(grid["row"].max())+1
+    a = math.sqrt(2*cols*rows/(math.sqrt(3)*n))  # row spacing; columns sit a*sqrt(3)/2 apart
+    nc = max(1, min(cols, n, round(cols/(a*math.sqrt(3)/2))))
+    nr = max(1, min(rows, n//nc))
+    col, row = grid["col"].to_numpy(), grid["row"].to_numpy()
+    keep = np.zeros(len(grid), bool)
+    for k, c in enumerate(((np.arange(nc)+0.5)*cols/nc).astype(int)):
+        off = 0.25 + 0.5*(k % 2) if nc > 1 and nr > 1 else 0.5
+        keep |= (col == c) & np.isin(row, ((np.arange(nr)+off)*rows/nr).astype(int))
+    return np.flatnonzero(keep)
+
+def fire_density(grid, firms):
+    """Log FIRMS counts within FIRE_RADIUS cells of each cell, scaled to 0..1."""
+    if firms is None or firms.empty:
+        return np.zeros(len(grid))
+    b = grid.bounds
+    xe = np.append(np.sort(b["minx"].unique()), b["maxx"].max())
+    ye = np.append(np.sort(b["miny"].unique()), b["maxy"].max())
+    h, _, _ = np.histogram2d(firms.geometry.x, firms.geometry.y, bins=[xe, ye])
+    k = 2*FIRE_RADIUS+1
+    p = np.pad(h, FIRE_RADIUS)
+    h = sum(p[i:i+h.shape[0], j:j+h.shape[1]] for i in range(k) for j in range(k))
+    d = np.log1p(h[grid["col"].to_numpy(), grid["row"].to_numpy()])
+    return d/d.max() if d.max() > 0 else d
+
+def sq_dist(cand, pts):
+    """Squared grid distance (in cells) from every candidate to every point."""
+    return np.subtract.outer(cand[:,0], pts[:,0])**2 + np.subtract.outer(cand[:,1], pts[:,1])**2
+
+def disagreement(cand, pts, vals):
+    """Spread of the nearest samples' standardised fields at each candidate, and
+    the distance (in cells) from each candidate to its nearest sample."""
+    sd = np.nanstd(vals, axis=0)
+    z = np.nan_to_num((vals - np.nanmean(vals, axis=0)) / np.where(sd > 0, sd, np.nan))
+    d2 = sq_dist(cand, pts)
+    k = min(NEIGHBOURS, len(pts))
+    nn = np.argpartition(d2, k-1, axis=1)[:, :k]
+    return z[nn].std(axis=1).mean(axis=1), np.sqrt(d2.min(axis=1))
+
+def pick_batch(cand, base, dist, n):
+    """Greedily take the n highest-scoring candidates, discounting cells next to
+    ones already picked so a batch spreads over several hot spots."""
+    dist = dist.copy(); picked = []
+    for _ in range(min(n, len(cand))):
+        i = int(np.argmax((base + SPACE_WEIGHT) * dist))
+        if dist[i] <= 0:
+            break
+        picked.append(i)
+        dist = np.minimum(dist, np.hypot(*(cand - cand[i]).T))
+    return np.array(picked, dtype=int)
+
+def adaptive_sample(grid, fire, pool, fetcher=sample, budget=MAX_REQUESTS):
+    """Coarse uniform pass, then refinement rounds at the cells where neighbouring
+    samples disagree most or FIRMS detections are dense. Returns weather rows."""
+    ij = grid[["col","row"]].to_numpy(float)
+    cen = grid.geometry.centroid  # OK for sampling
+    lat, lon = cen.y.to_numpy(), cen.x.to_numpy()
+    tried = np.zeros(len(grid), bool); got=[]; rows=[]
+
+    def run(idx):
+        tried[idx] = True
+        for i, lh in zip(idx, pool.map(fetcher, lat[idx], lon[idx])):
+            if lh:
+                got.append(i); rows.append(lh)
+
+    coarse = coarse_cells(grid, max(1, int(budget*COARSE_FRACTION)))
+    print(f"▶ Coarse pass: {len(coarse)} cells")
+    run(coarse)
+    rnd = 0
+    while tried.sum() < budget:
+        cand = np.flatnonzero(~tried)
+        if not len(cand):
+            break
+        if got:
+            vals = np.array([[r[f] for f in FIELDS] for r in rows], dtype=float)
+            spread, dist = disagreement(ij[cand], ij[got], vals)
+            base = spread + FIRE_WEIGHT*fire[cand]
+        else:
+            # nothing fetched yet (outage, rate limiting): keep spreading the
+            # budget over cells away from the failed ones rather than giving up
+            dist = np.sqrt(sq_dist(ij[cand], ij[tried]).min(axis=1))
+            base = np.zeros(len(cand))
+        batch = pick_batch(ij[cand], base, dist, min(BATCH_SIZE, budget - int(tried.sum())))
+        if not len(batch):
+            break
+        rnd += 1
+        print(f"▶ Refinement round {rnd}: {len(batch)} cells")
+        run(cand[batch])
+    return rows
+
 def main():
     print("▶ Building 5km grid...")
     grid = make_grid(BBOX, 5.0)
-    target=300; step=max(1, math.ceil(len(grid)/target))
-    grid_s = grid.iloc[::step].copy()
-    grid_s["centroid"]=grid_s.geometry.centroid  # OK for sampling
-
-    print(f"▶ Fetching Open-Meteo weather for {len(grid_s)} grid centroids (step={step})...")
-    rows=[]
-    for _, r in grid_s.iterrows():
-        c=r["centroid"]; lat,lon=float(c.y), float(c.x)
-        try:
-            p = fetch(lat,lon)
-            lh = latest_hour(p)
-            if not lh:
-                continue
-            lh["lat"]=lat; lh["lon"]=lon
-            rows.append(lh)
-        except Exception as e:
-            print(f"⚠ Weather fetch failed for {lat:.4f},{lon:.4f}: {e}")
+    firms = load_firms_points()
+    if firms is None:
+        print("ℹ No firms_*.geojson found; refining on weather gradients only.")
+    fire = fire_density(grid, firms)
+
+    print(f"▶ Fetching Open-Meteo weather for up to {MAX_REQUESTS} of {len(grid)} cells...")
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        rows = adaptive_sample(grid, fire, pool)
     if not rows:
         print("⚠ No weather rows fetched.")
         return
@@ -1,18 +1,15 @@
-﻿import os, glob, numpy as np, pandas as pd, geopandas as gpd
+﻿import os, numpy as np, pandas as pd, geopandas as gpd
 from datetime import datetime
 from src.utils.config import PROCESSED_DIR
+from src.utils.paths import latest_file
 
 CRS_METERS = "EPSG:3347"
 BUFFER_KM = 10.0
 OUT_GEOJSON = os.path.join(PROCESSED_DIR, "risk_latest.geojson")
 OUT_CSV     = os.path.join(PROCESSED_DIR, "risk_latest.csv")
 
-def _latest(pat):
-    files = glob.glob(pat)
-    return max(files, key=os.path.getmtime) if files else None
-
 def load_latest_weather():
-    p = _latest(os.path.join(PROCESSED_DIR, "weather_grid_*.geojson"))
+    p = latest_file(os.path.join(PROCESSED_DIR, "weather_grid_*.geojson"))
     if not p: raise FileNotFoundError("No weather_grid_*.geojson found")
     wx = gpd.read_file(p).to_crs(CRS_METERS)
     for c in ["temperature_2m","relative_humidity_2m","windspeed_10m","winddirection_10m"]:
@@ -20,7 +17,7 @@ def load_latest_weather():
     return wx, p
 
 def load_latest_firms():
-    p = _latest(os.path.join(PROCESSED_DIR, "firms_*.geojson"))
+    p = latest_file(os.path.join(PROCESSED_DIR, "firms_*.geojson"))
     if not p: raise FileNotFoundError("No firms_*.geojson found")
     return gpd.read_file(p).to_crs(CRS_METERS), p
 
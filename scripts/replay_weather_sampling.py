@@ -0,0 +1,146 @@
+﻿r"""
+Replay a dense weather grid through a stub fetcher and compare the adaptive
+sampler in get_weather_data against the old fixed-stride sampling. Replays
+make no network calls.
+
+Error is the mean absolute difference between each cell's value and the
+value of its nearest sample (how the merged risk points stand in for the grid).
+
+Run:
+  # record every cell's latest hour once (one Open-Meteo call per cell)
+  python -m scripts.replay_weather_sampling --record data/raw/weather_dense.csv
+  # replay a recording, optionally with the FIRMS file from the same day
+  python -m scripts.replay_weather_sampling 250 300 --recording data/raw/weather_dense.csv \
+      --firms data/processed/firms_VIIRS_NOAA20_NRT_<date>.geojson
+  # synthetic fields only
+  python -m scripts.replay_weather_sampling 250 300
+"""
+import io, math, argparse, contextlib, numpy as np, pandas as pd, geopandas as gpd
+from concurrent.futures import ThreadPoolExecutor
+from shapely.geometry import Point
+from src.utils.config import BBOX
+from scripts import get_weather_data as gw
+
+STRIDE_TARGET = 300  # the old main(): step = ceil(len(grid)/300)
+DIRECTIONS = 12      # gradient directions averaged for the smooth field
+FIRES = [(-99.3, 53.1), (-97.2, 50.4)]
+
+def linear(theta):
+    """Smooth field: plain gradients, RH and wind rotated 60 and 120 degrees from temperature."""
+    def field(lat, lon):
+        x, y = (lon+98.5)*111.32*math.cos(math.radians(52)), (lat-52)*111.0
+        g = lambda a: x*math.cos(theta+a) + y*math.sin(theta+a)
+        return 15 + 0.01*g(0), 55 - 0.03*g(math.pi/3), 12 + 0.008*g(2*math.pi/3)
+    return field
+
+def front(lat, lon):
+    t, rh, ws = linear(math.radians(30))(lat, lon)
+    f = np.tanh((lon + 0.4*(lat-52) + 98.5) / 0.08)
+    return t + 6*f, rh - 15*f, ws + 2*f
+
+def synthetic_firms(seed=0):
+    """Detections clustered around FIRES. The synthetic fields carry no anomaly
+    there, so this case measures what FIRE_WEIGHT costs, not what it gains."""
+    rng = np.random.default_rng(seed)
+    pts = np.concatenate([np.array(f) + rng.normal(0, 0.05, (200, 2)) for f in FIRES])
+    return gpd.GeoDataFrame(geometry=[Point(x, y) for x, y in pts], crs="EPSG:4326")
+
+def centroids(grid):
+    cen = grid.geometry.centroid  # OK for sampling
+    return cen.y.to_numpy(), cen.x.to_numpy()
+
+def field_values(grid, field):
+    return np.column_stack(field(*centroids(grid)))
+
+def load_recording(grid, path):
+    """Per-cell FIELDS from a dense weather_grid-style CSV (lat, lon, fields).
+    Cells the recording does not cover are NaN and replay as failed fetches."""
+    df = pd.read_csv(path)
+    pts = gpd.GeoDataFrame(df, geometry=[Point(xy) for xy in zip(df["lon"], df["lat"])], crs="EPSG:4326")
+    j = gpd.sjoin(pts, grid[["geometry"]], predicate="within", how="inner")
+    vals = np.full((len(grid), len(gw.FIELDS)), np.nan)
+    vals[j["index_right"].to_numpy()] = j[list(gw.FIELDS)].to_numpy(float)
+    return vals
+
+def record(grid, path):
+    print(f"▶ Recording {len(grid)} cells (one Open-Meteo call each)...")
+    lat, lon = centroids(grid)
+    with ThreadPoolExecutor(max_workers=gw.WORKERS) as pool:
+        rows = [r for r in pool.map(gw.sample, lat, lon) if r]
+    pd.DataFrame(rows).to_csv(path, index=False)
+    print(f"✅ {len(rows)} cells saved: {path}")
+
+def make_stub(grid, vals):
+    """Fetcher replaying vals for the cell at (lat, lon); also returns its call log."""
+    lat, lon = centroids(grid)
+    ref = dict(zip(zip(lat.round(6), lon.round(6)), range(len(grid))))
+    calls = []
+    def stub(la, lo):
+        i = ref[(round(la, 6), round(lo, 6))]
+        calls.append(i)
+        if np.isnan(vals[i]).any():
+            return None
+        row = dict(zip(gw.FIELDS, vals[i]))
+        row.update(timestamp="replay", winddirection_10m=0.0, lat=la, lon=lo, _cell=i)
+        return row
+    return stub, calls
+
+def nn_error(grid, vals, idx, mask=None):
+    """Mean absolute error per field when each cell takes its nearest sample's value."""
+    ij = grid[["col","row"]].to_numpy(float)
+    err = np.abs(vals[idx[gw.sq_dist(ij, ij[idx]).argmin(axis=1)]] - vals)
+    if mask is not None:
+        err = err[mask]
+    return np.nanmean(err, axis=0)
+
+def replay(grid, vals, fire, budget):
+    stub, calls = make_stub(grid, vals)
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=gw.WORKERS) as pool:
+        rows = gw.adaptive_sample(grid, fire, pool, fetcher=stub, budget=budget)
+    return np.array([r["_cell"] for r in rows]), len(calls)
+
+def fmt(e):
+    return " ".join(f"{v:6.3f}" for v in e)
+
+def compare(name, grid, cases, budgets, firms=None):
+    """cases: list of dense value arrays; errors are averaged over them."""
+    fire = gw.fire_density(grid, firms)
+    near = fire > 0 if firms is not None else None
+    stride = np.arange(0, len(grid), max(1, math.ceil(len(grid)/STRIDE_TARGET)))
+    calls = len(stride)  # cells missing from a recording still cost the old loop a call
+    stride = stride[[not np.isnan(v).any() for v in cases[0][stride]]]
+    def line(label, n, idxs):
+        e = np.mean([nn_error(grid, v, i) for v, i in zip(cases, idxs)], axis=0)
+        s = f"  {label:8s} {n:4d} calls  {fmt(e)}"
+        if near is not None:
+            s += " | " + fmt(np.mean([nn_error(grid, v, i, near) for v, i in zip(cases, idxs)], axis=0))
+        print(s)
+    print(f"\n{name}")
+    line("stride", calls, [stride]*len(cases))
+    for b in budgets:
+        runs = [replay(grid, v, fire, b) for v in cases]
+        line("adaptive", runs[0][1], [i for i, _ in runs])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("budgets", nargs="*", type=int)
+    ap.add_argument("--recording", help="dense per-cell CSV to replay")
+    ap.add_argument("--firms", help="FIRMS GeoJSON paired with the recording")
+    ap.add_argument("--record", metavar="PATH", help="fetch every cell and save a recording")
+    a = ap.parse_args()
+    grid = gw.make_grid(BBOX, 5.0)
+    if a.record:
+        record(grid, a.record); return
+    budgets = a.budgets or [gw.MAX_REQUESTS]
+    print(f"Grid: {len(grid)} cells. Mean abs error (temp / RH / wind), all cells [| near FIRMS]")
+    if a.recording:
+        firms = gpd.read_file(a.firms).to_crs("EPSG:4326") if a.firms else None
+        compare(f"recording {a.recording}", grid, [load_recording(grid, a.recording)], budgets, firms)
+        return
+    smooth = [field_values(grid, linear(t)) for t in np.linspace(0, math.pi, DIRECTIONS, endpoint=False)]
+    compare(f"smooth (mean of {DIRECTIONS} gradient directions)", grid, smooth, budgets)
+    compare("front", grid, [field_values(grid, front)], budgets)
+    compare("front + synthetic FIRMS", grid, [field_values(grid, front)], budgets, synthetic_firms())
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
-import os
+import os, glob
 from .config import RAW_DIR, PROCESSED_DIR, MAP_DIR
 
 def ensure_dirs():
     for d in (RAW_DIR, PROCESSED_DIR, MAP_DIR):
-        os.makedirs(d, exist_ok=True)
\ No newline at end of file
+        os.makedirs(d, exist_ok=True)
+
+def latest_file(pat):
+    files = glob.glob(pat)
+    return max(files, key=os.path.getmtime) if files else None
\ No newline at end of file